@@ -1,10 +1,87 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
 import re
 import time
+from urllib.parse import quote
 '''
     已停止使用，改为使用 bangumi_api.py 中的 get_bangumi_details_for_scraping 函数
 '''
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# bgm.tv 页面地址模板，在导入时拼接一次
+_BASE_URL = "https://bgm.tv"
+_SEARCH_URL_TMPL = _BASE_URL + "/subject_search/{}?cat=2"
+_SUBJECT_URL_TMPL = _BASE_URL + "/subject/{}"
+
+_SESSION = None
+
+# 详情页 infobox 中“话数:”标签及其后数字的匹配规则
+_EPISODE_TIP_RE = re.compile(r'^\s*话数:\s*$')
+_DIGITS_RE = re.compile(r'(\d+)')
+
+
+class TokenBucket:
+    """
+    简单的令牌桶限速器：允许少量突发请求立即发出，只有持续请求才需要等待。
+
+    Args:
+        rate (float): 每秒补充的令牌数。
+        capacity (int): 桶的容量，即允许的最大突发请求数。
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞到补足为止。"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.rate)
+            self.ts = time.monotonic()
+            self.tokens = 0
+        else:
+            self.tokens -= 1
+
+
+# bgm.tv 共用一个令牌桶：每秒 2 个请求，最多突发 5 个
+_BUCKET = TokenBucket(rate=2.0, capacity=5)
+
+# get_bangumi_details 的结果缓存，键为规范化后的搜索词
+_DETAILS_CACHE = {}
+_DETAILS_CACHE_MAXSIZE = 1024
+
+
+def _normalize_term(search_term):
+    """合并多余空白并忽略大小写，使 'Title Season 2' 与 'title  season 2' 命中同一条缓存。"""
+    return ' '.join(search_term.split()).casefold()
+
+
+def _get_session():
+    """
+    懒加载模块级共享的 Session，复用与 bgm.tv 的 keep-alive 连接。
+
+    Returns:
+        requests.Session: 共享的 Session 实例。
+    """
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = requests.Session()
+        _SESSION.headers.update(HEADERS)
+        # 429 不在重试列表中：请求速率只由 _BUCKET 控制，适配器内部重试不会绕过限速
+        retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
+        _SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries))
+    return _SESSION
+
+
 def search_anime_and_get_id(search_term):
     """
     功能一：根据搜索词在 Bangumi 搜索，并获取第一个结果的中文名和 ID。
@@ -15,31 +92,28 @@ def search_anime_and_get_id(search_term):
     Returns:
         dict: 包含 'chinese_name' 和 'bangumi_id' 的字典，如果找不到则返回 None。
     """
-    search_url = f"https://bgm.tv/subject_search/{search_term}?cat=2"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    search_url = _SEARCH_URL_TMPL.format(quote(search_term, safe=''))
 
     try:
         print(f"\n正在搜索: '{search_term}'...")
-        time.sleep(0.5)
-        response = requests.get(search_url, headers=headers)
+        _BUCKET.acquire()
+        response = _get_session().get(search_url)
         response.raise_for_status()
         response.encoding = 'utf-8'
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        first_result = soup.find('li', class_='item')
+        tree = LexborHTMLParser(response.text)
+        first_result = tree.css_first('li.item')
 
         if not first_result:
             print("错误: 未找到任何条目。")
             return None
 
         # 提取中文名称
-        name_tag = first_result.find('a', class_='l')
-        chinese_name = name_tag.text.strip() if name_tag else "未知"
+        name_tag = first_result.css_first('a.l')
+        chinese_name = name_tag.text().strip() if name_tag else "未知"
 
         # 提取 Bangumi ID
-        bgm_id_raw = first_result.get('id')
+        bgm_id_raw = first_result.attributes.get('id')
         bgm_id = bgm_id_raw.replace('item_', '') if bgm_id_raw else None
         
         if not bgm_id:
@@ -67,35 +141,35 @@ def scrape_episode_count(bangumi_id):
     if not bangumi_id:
         return "未知"
         
-    subject_url = f"https://bgm.tv/subject/{bangumi_id}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    subject_url = _SUBJECT_URL_TMPL.format(bangumi_id)
 
     try:
         print(f"({bangumi_id}) 查询详情页...")
-        time.sleep(0.5)
-        response = requests.get(subject_url, headers=headers)
+        _BUCKET.acquire()
+        response = _get_session().get(subject_url)
         response.raise_for_status()
         response.encoding = 'utf-8'
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        tree = LexborHTMLParser(response.text)
 
         # 话数信息在 id="infobox" 的 ul 标签内
-        infobox = soup.find('ul', id='infobox')
+        infobox = tree.css_first('ul#infobox')
         if not infobox:
             print("未找到信息")
             return "未知"
         
         # 精准查找包含“话数:”文本的 <span> 标签
-        # 使用 re.compile 确保能匹配到 '话数:'，忽略前后可能存在的空格
-        episode_tip_span = infobox.find('span', class_='tip', string=re.compile(r'^\s*话数:\s*$'))
+        # 使用预编译的正则确保能匹配到 '话数:'，忽略前后可能存在的空格
+        episode_tip_span = next(
+            (span for span in infobox.css('span.tip') if _EPISODE_TIP_RE.search(span.text())),
+            None,
+        )
 
         if episode_tip_span:
             # 清理
-            parent_li_text = episode_tip_span.parent.get_text()
+            parent_li_text = episode_tip_span.parent.text()
 
-            match = re.search(r'(\d+)', parent_li_text)
+            match = _DIGITS_RE.search(parent_li_text)
             if match:
                 print(f"找到话数: {match.group(1)}")
                 return match.group(1)
@@ -121,6 +195,13 @@ def get_bangumi_details(search_term):
             'bangumi_id' = '389156'
             'episodes' = '25'
     """
+    key = _normalize_term(search_term)
+    cached = _DETAILS_CACHE.pop(key, None)
+    if cached is not None:
+        # 重新插入到末尾，使淘汰顺序为最近最少使用 (LRU)
+        _DETAILS_CACHE[key] = cached
+        return dict(cached)
+
     search_result = search_anime_and_get_id(search_term)
     
     if not search_result:
@@ -130,5 +211,12 @@ def get_bangumi_details(search_term):
     episode_count = scrape_episode_count(bangumi_id)
     
     search_result['episodes'] = episode_count
+
+    # 只缓存成功的结果；话数为 '未知' 时可能是请求失败，下次仍会重新请求
+    if episode_count != "未知":
+        if len(_DETAILS_CACHE) >= _DETAILS_CACHE_MAXSIZE:
+            # 字典头部即最久未使用的条目
+            _DETAILS_CACHE.pop(next(iter(_DETAILS_CACHE)))
+        _DETAILS_CACHE[key] = dict(search_result)
     
     return search_result
\ No newline at end of file